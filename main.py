@@ -5,15 +5,95 @@ import aiohttp
 import random
 import asyncio
 import json
-import requests
 import urllib.parse
 import time
+from collections import OrderedDict
+from html import unescape
 from loguru import logger
-from bs4 import BeautifulSoup
 from utils.plugin_base import PluginBase
 from utils.decorators import on_text_message
 from WechatAPI import WechatAPIClient
 
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，未安装时使用标准库json
+    orjson = None
+
+# 默认超时：总时长15秒，连接3秒，两次读取之间最多8秒
+_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=3, sock_read=8)
+
+# 默认请求头，同时作为共享会话的默认头，只在此处维护
+_DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Connection': 'keep-alive'
+}
+
+# 评论相关请求的固定请求头，Origin/Referer随当前域名变化，在发送时补充
+_COMMENT_PAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+}
+_COMMENT_POST_HEADERS = {
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+    "Cookie": "timezone=8",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
+    "X-Requested-With": "XMLHttpRequest"
+}
+
+# 搜索结果标题中的高亮标签
+_STRONG_RE = re.compile(r'</?strong>')
+# 详情页中的夸克网盘链接，字节版本用于流式扫描UTF-8页面
+_PAN_RE = re.compile(r'链接：(https://pan\.quark\.cn/s/[a-zA-Z0-9]+)')
+_PAN_RE_BYTES = re.compile(_PAN_RE.pattern.encode('utf-8'))
+# 评论页面表单action中的评论key
+_KEY_FORM_RE = re.compile(r'action="[^"]*cmd\.php\?act=cmt&amp;postid=2&amp;key=([a-zA-Z0-9]+)"')
+_KEY_QS_RE = re.compile(r'key=([a-zA-Z0-9]+)')
+# 评论表单标签及其action属性，用于主正则未命中时的兜底
+_COMMENT_FORM_RE = re.compile(r'<form\b[^>]*\bid=["\']frmSumbit["\'][^>]*>', re.IGNORECASE)
+_FORM_ACTION_RE = re.compile(r'\baction=["\']([^"\']+)["\']', re.IGNORECASE)
+# 搜索页面中的<a>标签（允许引号内出现'>'）及其属性
+_ANCHOR_TAG_RE = re.compile(rb'<a\s(?:[^>"\']|"[^"]*"|\'[^\']*\')*>', re.IGNORECASE)
+_ATTR_RE = re.compile(rb'([a-zA-Z_:][-a-zA-Z0-9_:.]*)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+def _json_dumps(data):
+    """序列化为UTF-8编码的JSON字节串，优先使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+def _json_loads(data):
+    """反序列化JSON字符串或字节串，优先使用orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class _AsyncRateLimiter:
+    """异步令牌桶限速器，time_period秒内最多放行max_rate个请求"""
+
+    def __init__(self, max_rate, time_period=1.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = float(max_rate)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.max_rate, self._tokens + (now - self._last) * self.max_rate / self.time_period)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.time_period / self.max_rate)
+
 class DuanjuSpider(PluginBase):
     description = "短剧搜索插件"
     author = "BEelzebub"
@@ -26,13 +106,49 @@ class DuanjuSpider(PluginBase):
         self.urls_file = os.path.join(self.plugin_dir, "search_urls.json")
         
         # 搜索结果缓存，格式为 {用户ID: {'results': [...], 'keyword': '...', 'timestamp': ...}}
-        self.search_cache = {}
+        # 按写入时间排序，最早写入的在最前面，便于从头部淘汰过期项
+        self.search_cache: OrderedDict[str, dict] = OrderedDict()
+        # 关键词搜索结果缓存，所有用户共享，格式为 {关键词: (timestamp, results)}
+        self._keyword_cache: OrderedDict[str, tuple[float, list]] = OrderedDict()
         # 缓存过期时间（秒）
         self.cache_expire_time = 300  # 5分钟
+        # 每种缓存最多保留的条目数
+        self.max_cache_size = 1000
+        # 上次清理缓存的时间，清理最多每秒执行一次
+        self._last_cache_clean = 0.0
+        
+        # 网盘链接缓存，格式为 {详情页URL: (timestamp, pan_link)}，pan_link为None表示该页没有网盘链接
+        # 按访问顺序排列，超出容量时淘汰最久未使用的条目
+        self._pan_cache: OrderedDict[str, tuple[float, str | None]] = OrderedDict()
+        # 网盘链接缓存过期时间（秒）
+        self.pan_cache_expire_time = 3600  # 1小时
+        # 没有网盘链接的页面缓存较短时间，避免反复请求失效页面
+        self.pan_cache_negative_expire_time = 60
+        # 网盘链接缓存最大条目数
+        self.pan_cache_size = 512
         
         # 加剧命令
         self.add_drama_command = "加剧"
         
+        # 共享的HTTP会话，首次使用时创建，复用连接池
+        self._session: aiohttp.ClientSession | None = None
+        
+        # 按域名划分的限速器，格式为 {域名: _AsyncRateLimiter}
+        self._rate_limiters: dict[str, _AsyncRateLimiter] = {}
+        # 每个域名每秒最多请求数
+        self.max_rate_per_host = 5
+        # 详情页重试前最长等待时间（秒）
+        self.max_retry_delay = 5
+        # 最近确认可用的搜索URL，格式为 (url, timestamp)，有效期内搜索时跳过可访问性探测
+        self._alive_base_url: tuple[str, float] | None = None
+        self.alive_url_expire_time = 120
+        # 详情页最大并发请求数，所有搜索共享，避免多个用户同时搜索时并发叠加
+        self.detail_concurrency = 8
+        self._detail_semaphore = asyncio.Semaphore(self.detail_concurrency)
+        
+        # 短链接解析结果的有效期（秒），有效期内重启插件不再重新解析
+        self.url_refresh_interval = 86400  # 24小时
+        
         try:
             with open(config_path, "rb") as f:
                 config = tomllib.load(f)
@@ -40,7 +156,7 @@ class DuanjuSpider(PluginBase):
             self.enable = config.get("enable", False)
             self.command = config.get("command", "短剧")
             self.add_drama_command = config.get("add_drama_command", "加剧")
-            self.whitelist_groups = config.get("whitelist_groups", [])
+            self.whitelist_groups = set(config.get("whitelist_groups", []))
             self.max_results = config.get("max_results", 10)  # 最大显示结果数
             
             # 从config.toml中读取URL配置
@@ -51,6 +167,7 @@ class DuanjuSpider(PluginBase):
             urls_data = self.load_urls(config_base_urls, config_short_urls)
             self.base_urls = urls_data.get("base_urls", config_base_urls)
             self.short_urls = urls_data.get("short_urls", config_short_urls)
+            self.last_resolved = urls_data.get("last_resolved", 0)
             
         except Exception as e:
             logger.error(f"加载短剧插件配置文件失败: {str(e)}")
@@ -59,8 +176,12 @@ class DuanjuSpider(PluginBase):
             self.add_drama_command = "加剧"
             self.base_urls = ["https://a80.35240.com/search.php", "https://b.21410.com/search.php"]
             self.short_urls = ["A80.CC", "A20.CC", "E50.CC", "47C.CC"]
-            self.whitelist_groups = []
+            self.last_resolved = 0
+            self.whitelist_groups = set()
             self.max_results = 10
+            
+        # 规范化后的基础URL集合，用于update_urls中O(1)去重，新增URL时同步更新
+        self._normalized_base_urls = {url.rstrip('/') for url in self.base_urls}
 
     def load_urls(self, config_base_urls, config_short_urls):
         """从JSON文件加载URL列表，如果不存在则使用config.toml中的配置创建默认值"""
@@ -70,115 +191,214 @@ class DuanjuSpider(PluginBase):
         }
         
         if not os.path.exists(self.urls_file):
-            with open(self.urls_file, 'w', encoding='utf-8') as f:
-                json.dump(default_urls, f, ensure_ascii=False, indent=4)
+            self._write_urls_file(default_urls)
             return default_urls
         
         try:
-            with open(self.urls_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(self.urls_file, 'rb') as f:
+                return _json_loads(f.read())
         except Exception as e:
             logger.error(f'加载URL文件出错: {e}，使用config.toml中的配置')
             return default_urls
 
-    def save_urls(self, urls_data):
-        """保存URL列表到JSON文件"""
+    def _write_urls_file(self, urls_data):
+        """将URL列表写入JSON文件（阻塞操作）"""
+        # 先写临时文件再替换，避免写入中断导致文件损坏
+        tmp_file = f'{self.urls_file}.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(_json_dumps(urls_data))
+        os.replace(tmp_file, self.urls_file)
+
+    async def save_urls(self, urls_data):
+        """保存URL列表到JSON文件，在线程中写入避免阻塞事件循环"""
         try:
-            with open(self.urls_file, 'w', encoding='utf-8') as f:
-                json.dump(urls_data, f, ensure_ascii=False, indent=4)
+            await asyncio.to_thread(self._write_urls_file, urls_data)
             logger.info(f'URL列表已保存至 {self.urls_file}')
         except Exception as e:
             logger.error(f'保存URL文件出错: {e}')
 
     async def async_init(self):
         try:
-            # 启动时更新URL列表
-            await self.update_urls()
+            # 启动时更新URL列表，距上次解析未超过有效期则跳过
+            if time.time() - self.last_resolved < self.url_refresh_interval:
+                logger.info("[短剧插件] 短链接解析结果仍在有效期内，跳过更新URL列表")
+            else:
+                await self.update_urls()
             logger.info("[短剧插件] 插件初始化完成")
         except Exception as e:
             logger.error(f"短剧插件异步初始化失败: {str(e)}")
             self.enable = False
             
+    async def _get_session(self):
+        """获取共享的aiohttp会话，不存在或已关闭时重新创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=10,
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+                enable_cleanup_closed=True
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=_TIMEOUT,
+                headers=_DEFAULT_HEADERS
+            )
+        return self._session
+
+    def _get_rate_limiter(self, url):
+        """获取URL所属域名的限速器"""
+        host = urllib.parse.urlparse(url).netloc
+        limiter = self._rate_limiters.get(host)
+        if limiter is None:
+            limiter = _AsyncRateLimiter(self.max_rate_per_host, 1.0)
+            self._rate_limiters[host] = limiter
+        return limiter
+
+    async def close(self):
+        """关闭共享的aiohttp会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def on_disable(self):
+        """插件禁用时释放HTTP会话"""
+        await super().on_disable()
+        await self.close()
+            
     def _clean_expired_cache(self):
-        """清理过期的缓存"""
-        current_time = asyncio.get_event_loop().time()
-        expired_keys = []
+        """清理过期的缓存，缓存按写入时间排序，只需从头部弹出过期项"""
+        current_time = time.monotonic()
+        if current_time - self._last_cache_clean < 1:
+            return
+        self._last_cache_clean = current_time
+        expired_count = 0
         
-        for key, cache_data in self.search_cache.items():
-            if current_time - cache_data['timestamp'] > self.cache_expire_time:
-                expired_keys.append(key)
-                
-        for key in expired_keys:
-            del self.search_cache[key]
+        while self.search_cache:
+            cache_data = next(iter(self.search_cache.values()))
+            if current_time - cache_data['timestamp'] <= self.cache_expire_time:
+                break
+            self.search_cache.popitem(last=False)
+            expired_count += 1
+            
+        while self._keyword_cache:
+            timestamp, _ = next(iter(self._keyword_cache.values()))
+            if current_time - timestamp <= self.cache_expire_time:
+                break
+            self._keyword_cache.popitem(last=False)
+            expired_count += 1
             
-        if expired_keys:
-            logger.info(f"[短剧插件] 已清理 {len(expired_keys)} 条过期缓存")
+        if expired_count:
+            logger.info(f"[短剧插件] 已清理 {expired_count} 条过期缓存")
+
+    def _put_cache(self, cache, key, value, max_size=None):
+        """写入缓存并移到末尾，超出容量（默认max_cache_size）时淘汰最早的条目"""
+        if max_size is None:
+            max_size = self.max_cache_size
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+    async def _retry(self, coro_fn, attempts=3, base=0.5, retry_on_none=True):
+        """
+        按指数退避加随机抖动重试异步操作
+        
+        Args:
+            coro_fn: 无参数的异步函数，返回None或抛出异常视为失败
+            attempts: 最大尝试次数
+            base: 首次重试前的等待时间（秒），之后逐次翻倍
+            retry_on_none: 返回None时是否重试，结果确定的失败应设为False，只对异常重试
+        
+        Returns:
+            coro_fn首次成功的返回值，全部失败时返回None
+        """
+        attempt = 0
+        while attempt < attempts:
+            try:
+                result = await coro_fn()
+                if result is not None or not retry_on_none:
+                    return result
+            except aiohttp.ClientConnectorError as e:
+                logger.error(f'连接失败: {e}')
+                # 连接失败多为主机不可用，最多再重试一次
+                attempts = min(attempts, attempt + 2)
+            except Exception as e:
+                logger.error(f'请求出错: {e}')
+                
+            if attempt < attempts - 1:
+                await asyncio.sleep(base * 2 ** attempt + random.random() * 0.2)
+            attempt += 1
+        return None
 
     async def resolve_short_url(self, short_url, headers, max_retries=3):
         """解析短链接获取实际URL，处理HTTP 302跳转"""
         if not short_url.startswith('http'):
             short_url = f'http://{short_url}'
         
-        retry_count = 0
-        while retry_count < max_retries:
-            try:
-                logger.info(f'尝试解析短链接: {short_url}')
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(short_url, headers=headers, timeout=10, allow_redirects=False) as response:
-                        status_code = response.status
-                        
-                        if status_code in (301, 302, 303, 307, 308):
-                            # 获取重定向URL
-                            redirect_url = response.headers.get('Location')
-                            logger.info(f'发现重定向: {status_code}, 目标URL: {redirect_url}')
-                            
-                            if redirect_url:
-                                return redirect_url
-                            else:
-                                logger.warning(f'重定向响应中没有Location头: {response.headers}')
-                        elif status_code == 200:
-                            # 没有重定向但请求成功
-                            logger.info(f'短链接没有重定向，返回原始URL: {short_url}')
-                            return short_url
-                        else:
-                            logger.warning(f'短链接解析失败，HTTP状态码: {status_code}')
-                
-                retry_count += 1
-                if retry_count < max_retries:
-                    await asyncio.sleep(2)  # 等待一段时间后重试
-                    
-            except Exception as e:
-                logger.error(f'解析短链接出错: {short_url}, 错误: {e}')
-                retry_count += 1
-                if retry_count < max_retries:
-                    await asyncio.sleep(2)  # 等待一段时间后重试
+        async def _resolve_once():
+            logger.info(f'尝试解析短链接: {short_url}')
+            session = await self._get_session()
+            await self._get_rate_limiter(short_url).acquire()
+            # 只需要状态码和Location头，使用HEAD避免下载响应体
+            async with session.head(short_url, headers=headers, allow_redirects=False) as response:
+                status_code = response.status
+                response_headers = response.headers
+            if status_code == 405:
+                # 服务器不支持HEAD时退回GET
+                async with session.get(short_url, headers=headers, allow_redirects=False) as response:
+                    status_code = response.status
+                    response_headers = response.headers
+            
+            if status_code in (301, 302, 303, 307, 308):
+                # 获取重定向URL
+                redirect_url = response_headers.get('Location')
+                logger.info(f'发现重定向: {status_code}, 目标URL: {redirect_url}')
                 
-        logger.error(f'短链接解析失败，已达到最大重试次数: {short_url}')
-        return None
+                if redirect_url:
+                    return redirect_url
+                else:
+                    logger.warning(f'重定向响应中没有Location头: {response_headers}')
+            elif status_code == 200:
+                # 没有重定向但请求成功
+                logger.info(f'短链接没有重定向，返回原始URL: {short_url}')
+                return short_url
+            else:
+                logger.warning(f'短链接解析失败，HTTP状态码: {status_code}')
+            return None
+        
+        resolved_url = await self._retry(_resolve_once, attempts=max_retries)
+        if resolved_url is None:
+            logger.error(f'短链接解析失败，已达到最大重试次数: {short_url}')
+        return resolved_url
 
     async def update_urls(self):
         """更新URL列表，解析短链并保存"""
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        }
+        headers = _DEFAULT_HEADERS
         
         # 加载URL数据
         urls_data = {
             "base_urls": self.base_urls,
-            "short_urls": self.short_urls
+            "short_urls": self.short_urls,
+            "last_resolved": self.last_resolved
         }
         
-        # 规范化基础URL（用于比较）
-        normalized_base_urls = [url.rstrip('/') for url in self.base_urls]
-        
         # 存储已解析的URL
         new_urls = []
         
         logger.info('正在解析短链接...')
-        for short_url in self.short_urls:
-            logger.info(f'解析短链接: {short_url}')
-            resolved_url = await self.resolve_short_url(short_url, headers)
+        # 各短链接相互独立，并发解析
+        resolved = await asyncio.gather(
+            *[self.resolve_short_url(short_url, headers) for short_url in self.short_urls],
+            return_exceptions=True
+        )
+        resolved_count = 0
+        for short_url, resolved_url in zip(self.short_urls, resolved):
+            if isinstance(resolved_url, Exception):
+                logger.error(f'解析短链接出错: {short_url}, 错误: {resolved_url}')
+                continue
             if resolved_url:
+                resolved_count += 1
                 logger.info(f'已解析为: {resolved_url}')
                 
                 # 确保URL包含search.php路径
@@ -190,45 +410,69 @@ class DuanjuSpider(PluginBase):
                 
                 # 检查是否为新URL
                 normalized_url = resolved_url.rstrip('/')
-                if normalized_url not in normalized_base_urls and normalized_url not in [u.rstrip('/') for u in new_urls]:
-                    new_urls.append(resolved_url)
+                if normalized_url in self._normalized_base_urls:
+                    continue
+                self._normalized_base_urls.add(normalized_url)
+                new_urls.append(resolved_url)
                     
-        # 如果有新URL，添加并保存
+        # 如果有新URL，添加到列表
         if new_urls:
             logger.info(f'新增 {len(new_urls)} 个搜索URL:')
             for url in new_urls:
                 logger.info(f'- {url}')
-                self.base_urls.append(url)
-                normalized_base_urls.append(url.rstrip('/'))
-            
-            # 保存更新后的URL列表
+            self.base_urls.extend(new_urls)
             urls_data["base_urls"] = self.base_urls
-            self.save_urls(urls_data)
         else:
             logger.info('没有新的URL需要添加')
+            
+        # 至少成功解析一个短链接时记录解析时间，全部失败则下次启动重新解析
+        if resolved_count:
+            self.last_resolved = time.time()
+            urls_data["last_resolved"] = self.last_resolved
+            
+        # 保存更新后的URL列表
+        if new_urls or resolved_count:
+            await self.save_urls(urls_data)
 
     async def check_url_accessibility(self, url, headers):
-        """测试URL是否可访问"""
+        """测试URL是否可访问，使用HEAD请求只获取响应头"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, timeout=5) as response:
-                    return response.status == 200
+            session = await self._get_session()
+            timeout = aiohttp.ClientTimeout(total=3)
+            async with session.head(url, headers=headers, timeout=timeout, allow_redirects=True) as response:
+                if response.status != 405:
+                    return response.status < 400
+            # 服务器不支持HEAD时退回GET
+            async with session.get(url, headers=headers, timeout=timeout) as response:
+                return response.status < 400
         except:
             return False
 
+    async def _probe(self, url, headers):
+        """探测单个URL，返回(url, 是否可访问)"""
+        return url, await self.check_url_accessibility(url, headers)
+
+    async def _first_healthy(self, urls, headers):
+        """并发探测URL列表，返回最先确认可访问的URL，全部不可用时返回None"""
+        tasks = [asyncio.create_task(self._probe(u, headers)) for u in urls]
+        try:
+            for coro in asyncio.as_completed(tasks):
+                url, ok = await coro
+                if ok:
+                    return url
+        finally:
+            for task in tasks:
+                task.cancel()
+        return None
+
     # 生成评论所需的commentKey
     def generate_comment_key(self):
         """
         生成评论所需的commentKey
         格式为：当前毫秒级时间戳.随机数(保留12位小数)
         """
-        # 获取当前毫秒级时间戳
-        timestamp = int(time.time() * 1000)
-        # 生成0-1之间的随机数
-        random_num = random.random()
-        # 拼接为指定格式的字符串
-        comment_key = f"{timestamp}.{str(random_num).split('.')[1][:12]}"
-        return comment_key
+        # 毫秒级时间戳 + 12位随机整数，与随机小数截取12位的格式一致
+        return f"{int(time.time() * 1000)}.{random.randrange(10**11, 10**12)}"
 
     # 获取评论key
     async def get_comment_key(self):
@@ -236,7 +480,10 @@ class DuanjuSpider(PluginBase):
         从页面获取评论所需的key
         
         Returns:
-            str: 评论key
+            str: 评论key，页面异常或未找到key时返回None
+            
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: 网络错误交由调用方决定是否重试
         """
         if not hasattr(self, 'last_used_domain') or not self.last_used_domain:
             self.last_used_domain = "https://a80.35240.com"
@@ -245,46 +492,44 @@ class DuanjuSpider(PluginBase):
         url = f"{self.last_used_domain}/?id=2"
         logger.info(f"获取评论key，访问URL: {url}")
         
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-        }
+        headers = _COMMENT_PAGE_HEADERS
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, timeout=10) as response:
-                    if response.status != 200:
-                        logger.error(f"获取评论页面失败，状态码: {response.status}")
-                        return None
-                    
-                    html = await response.text()
-                    
+            session = await self._get_session()
+            await self._get_rate_limiter(url).acquire()
+            async with session.get(url, headers=headers) as response:
+                if response.status != 200:
+                    logger.error(f"获取评论页面失败，状态码: {response.status}")
+                    return None
+                
+                html = await response.text()
+                
             # 使用正则表达式提取key
-            key_pattern = r'action="[^"]*cmd\.php\?act=cmt&amp;postid=2&amp;key=([a-zA-Z0-9]+)"'
-            key_match = re.search(key_pattern, html)
+            key_match = _KEY_FORM_RE.search(html)
             
             if key_match:
                 key = key_match.group(1)
                 logger.info(f"成功获取评论key: {key}")
                 return key
             else:
-                # 尝试使用BeautifulSoup解析
-                soup = BeautifulSoup(html, 'html.parser')
-                form = soup.find('form', id='frmSumbit')
+                # 定位评论表单，从其action属性中提取key，无需解析整个页面
+                form_match = _COMMENT_FORM_RE.search(html)
+                action_match = _FORM_ACTION_RE.search(form_match.group(0)) if form_match else None
                 
-                if form and 'action' in form.attrs:
-                    action_url = form['action']
-                    key_match = re.search(r'key=([a-zA-Z0-9]+)', action_url)
+                if action_match:
+                    action_url = action_match.group(1)
+                    key_match = _KEY_QS_RE.search(action_url)
                     
                     if key_match:
                         key = key_match.group(1)
-                        logger.info(f"通过BeautifulSoup获取评论key: {key}")
+                        logger.info(f"通过评论表单获取评论key: {key}")
                         return key
                 
                 logger.error("未能在页面中找到评论key")
                 return None
                 
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            raise
         except Exception as e:
             logger.error(f"获取评论key时出错: {str(e)}")
             return None
@@ -305,8 +550,8 @@ class DuanjuSpider(PluginBase):
             self.last_used_domain = "https://a80.35240.com"
             logger.warning(f"未找到可用域名，使用默认域名: {self.last_used_domain}")
         
-        # 获取评论key
-        key = await self.get_comment_key()
+        # 获取评论key，只在网络错误时重试幂等的GET，评论提交本身不重试以免重复发表
+        key = await self._retry(self.get_comment_key, retry_on_none=False)
         if not key:
             return {
                 "success": False,
@@ -322,15 +567,9 @@ class DuanjuSpider(PluginBase):
         
         # 请求头
         headers = {
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Accept-Language": "zh-CN,zh;q=0.9",
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "Cookie": "timezone=8",
+            **_COMMENT_POST_HEADERS,
             "Origin": self.last_used_domain,
-            "Referer": f"{self.last_used_domain}/?id=2",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
-            "X-Requested-With": "XMLHttpRequest"
+            "Referer": f"{self.last_used_domain}/?id=2"
         }
         
         # 构建请求数据 - 按照正确的载荷格式
@@ -348,66 +587,67 @@ class DuanjuSpider(PluginBase):
         
         try:
             # 发送POST请求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url=url,
-                    headers=headers,
-                    data=data,
-                    timeout=10
-                ) as response:
-                    status = response.status
-                    logger.info(f"评论请求响应状态码: {status}")
+            session = await self._get_session()
+            await self._get_rate_limiter(url).acquire()
+            async with session.post(
+                url=url,
+                headers=headers,
+                data=data
+            ) as response:
+                status = response.status
+                logger.info(f"评论请求响应状态码: {status}")
+                
+                # 只读取一次响应体，再分别尝试按JSON和文本处理
+                body = await response.read()
+                try:
+                    # 尝试解析为JSON
+                    result = _json_loads(body)
+                    logger.info(f"评论请求响应JSON: {result}")
                     
-                    # 获取响应内容
-                    try:
-                        # 尝试解析为JSON
-                        result = await response.json()
-                        logger.info(f"评论请求响应JSON: {result}")
-                        
-                        # 检查响应状态码
-                        if status == 200:
+                    # 检查响应状态码
+                    if status == 200:
+                        return {
+                            "success": True,
+                            "data": result
+                        }
+                    else:
+                        return {
+                            "success": False,
+                            "message": f"请求失败，状态码: {status}",
+                            "response": result
+                        }
+                except ValueError:
+                    # 如果不是JSON，按文本处理
+                    text = body.decode(response.charset or 'utf-8', errors='replace')
+                    logger.info(f"评论请求响应内容前100字符: {text[:100]}")
+                    
+                    # 检查响应状态码
+                    if status == 200 or status == 302:
+                        # 检查是否包含成功提示
+                        if "评论发表成功" in text or "提交成功" in text or "success" in text.lower():
                             return {
                                 "success": True,
-                                "data": result
+                                "data": "评论发表成功"
                             }
                         else:
-                            return {
-                                "success": False,
-                                "message": f"请求失败，状态码: {status}",
-                                "response": result
-                            }
-                    except Exception as e:
-                        # 如果不是JSON，获取文本内容
-                        text = await response.text()
-                        logger.info(f"评论请求响应内容前100字符: {text[:100]}")
-                        
-                        # 检查响应状态码
-                        if status == 200 or status == 302:
-                            # 检查是否包含成功提示
-                            if "评论发表成功" in text or "提交成功" in text or "success" in text.lower():
+                            # 如果状态码是200，认为可能成功了
+                            if status == 200:
                                 return {
                                     "success": True,
-                                    "data": "评论发表成功"
-                                }
-                            else:
-                                # 如果状态码是200，认为可能成功了
-                                if status == 200:
-                                    return {
-                                        "success": True,
-                                        "data": "评论可能已提交，但无法确认结果"
-                                    }
-                                
-                                return {
-                                    "success": False,
-                                    "message": f"评论提交失败，响应内容不包含成功提示",
-                                    "response": text[:200]  # 只返回前200个字符，避免日志过长
+                                    "data": "评论可能已提交，但无法确认结果"
                                 }
-                        else:
+                            
                             return {
                                 "success": False,
-                                "message": f"请求失败，状态码: {status}",
-                                "response": text[:200]  # 只返回前200个字符
+                                "message": f"评论提交失败，响应内容不包含成功提示",
+                                "response": text[:200]  # 只返回前200个字符，避免日志过长
                             }
+                    else:
+                        return {
+                            "success": False,
+                            "message": f"请求失败，状态码: {status}",
+                            "response": text[:200]  # 只返回前200个字符
+                        }
         except Exception as e:
             logger.error(f"发送评论请求时出错: {str(e)}")
             return {
@@ -469,14 +709,8 @@ class DuanjuSpider(PluginBase):
                         await bot.send_at_message(chat_id, f"加剧成功，请在1天后重新搜索《{drama_name}》", [sender])
                         logger.info(f"[短剧插件] 加剧成功: {drama_name}")
                     else:
-                        # 如果错误信息包含JSON解析错误，但状态码是200，认为是成功的
-                        error_msg = result.get("message", "")
-                        if "200" in error_msg and ("JSON" in error_msg or "mimetype" in error_msg):
-                            await bot.send_at_message(chat_id, f"加剧成功，请在1天后重新搜索《{drama_name}》", [sender])
-                            logger.info(f"[短剧插件] 加剧成功(忽略JSON错误): {drama_name}")
-                        else:
-                            await bot.send_at_message(chat_id, f"加剧失败: {result.get('message', '未知错误')}", [sender])
-                            logger.error(f"[短剧插件] 加剧失败: {result.get('message', '未知错误')}")
+                        await bot.send_at_message(chat_id, f"加剧失败: {result.get('message', '未知错误')}", [sender])
+                        logger.error(f"[短剧插件] 加剧失败: {result.get('message', '未知错误')}")
                 else:
                     await bot.send_at_message(chat_id, f"加剧失败: 返回结果格式异常", [sender])
                     logger.error(f"[短剧插件] 加剧失败: 返回结果格式异常 {result}")
@@ -544,7 +778,17 @@ class DuanjuSpider(PluginBase):
             # 执行搜索
             try:
                 logger.info(f"[短剧插件] 收到搜索请求: {drama_name}")
-                results = await self.search_drama(drama_name)
+                now = time.monotonic()
+                
+                # 相同关键词在缓存有效期内直接复用，不同用户也可共享
+                hit = self._keyword_cache.get(drama_name)
+                if hit and now - hit[0] < self.cache_expire_time:
+                    logger.info(f"[短剧插件] 命中关键词缓存: {drama_name}")
+                    results = hit[1]
+                else:
+                    results = await self.search_drama(drama_name)
+                    if results:
+                        self._put_cache(self._keyword_cache, drama_name, (time.monotonic(), results))
                 
                 # 修改判断条件，检查结果是否为空列表或None
                 if not results or len(results) == 0:
@@ -556,26 +800,25 @@ class DuanjuSpider(PluginBase):
                     return False
                     
                 # 缓存结果
-                self.search_cache[cache_key] = {
+                self._put_cache(self.search_cache, cache_key, {
                     'results': results,
                     'keyword': drama_name,
-                    'timestamp': asyncio.get_event_loop().time()
-                }
+                    'timestamp': time.monotonic()
+                })
                 logger.info(f"[短剧插件] 已缓存搜索结果，用户: {cache_key}, 结果数: {len(results)}")
                 
                 # 组装第一步回复内容（只包含标题和编号）
                 max_show = min(len(results), self.max_results)
-                response = f'《{drama_name}》搜索结果：\n\n'
-                
-                for i, result in enumerate(results[:max_show], 1):
-                    response += f'【{i}】{result["title"]}\n'
+                lines = [f'《{drama_name}》搜索结果：', '']
+                lines.extend(f'【{i}】{result["title"]}' for i, result in enumerate(results[:max_show], 1))
                 
                 # 如果结果超过最大显示数，添加提示
                 if len(results) > max_show:
-                    response += f"\n还有 {len(results) - max_show} 条结果未显示...\n"
+                    lines.append(f"\n还有 {len(results) - max_show} 条结果未显示...")
                 
                 # 添加使用详情命令的提示
-                response += f"\n获取网盘链接请发送：{self.command}# 编号 (例如: {self.command}# 1)"
+                lines.append(f"\n获取网盘链接请发送：{self.command}# 编号 (例如: {self.command}# 1)")
+                response = '\n'.join(lines)
                 
                 await bot.send_at_message(chat_id, response.strip(), [sender])
                 logger.info(f"[短剧插件] 已发送搜索预览结果")
@@ -590,75 +833,175 @@ class DuanjuSpider(PluginBase):
 
     async def search_drama(self, keyword):
         logger.info(f'开始搜索短剧: {keyword}')
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Connection': 'keep-alive'
-        }
+        headers = _DEFAULT_HEADERS
         
         # 用于存储最后使用的可用URL的域名部分
         self.last_used_domain = None
         
-        # 测试每个URL的可访问性
-        for base_url in self.base_urls:
-            logger.info(f'测试URL: {base_url}')
-            if await self.check_url_accessibility(base_url, headers):
+        # 并发测试URL的可访问性，优先使用最先响应的可用站点，失败时再从剩余站点中选择
+        remaining_urls = list(self.base_urls)
+        cached_url = None
+        if self._alive_base_url and time.monotonic() - self._alive_base_url[1] < self.alive_url_expire_time:
+            if self._alive_base_url[0] in remaining_urls:
+                cached_url = self._alive_base_url[0]
+        while remaining_urls:
+            if cached_url:
+                # 最近确认可用的站点直接使用，失败后再探测其余站点
+                base_url, cached_url = cached_url, None
+                logger.info(f'使用最近可用的URL: {base_url}')
+            else:
+                logger.info(f'测试URL: {remaining_urls}')
+                base_url = await self._first_healthy(remaining_urls, headers)
+                if not base_url:
+                    break
                 logger.info(f'找到可用URL: {base_url}')
+            remaining_urls.remove(base_url)
+            try:
+                # 保存当前使用的域名
+                parsed_url = urllib.parse.urlparse(base_url)
+                self.last_used_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
+                logger.info(f'保存当前域名: {self.last_used_domain}')
+                
+                url = f'{base_url}?q={keyword}'
+                logger.info(f'正在访问: {url}')
+                session = await self._get_session()
+                await self._get_rate_limiter(url).acquire()
+                async with session.get(url, headers=headers) as response:
+                    if response.status != 200:
+                        logger.error(f"搜索页面请求失败，状态码: {response.status}")
+                        self._alive_base_url = None
+                        continue
+                    self._alive_base_url = (base_url, time.monotonic())
+                    # 先收集候选详情页，再并发获取网盘链接
+                    # 部分详情页可能没有网盘链接，多收集一些候选
+                    candidates = await self._scan_search_links(response, self.max_results * 2)
+                
+                async def _fetch(title, href):
+                    # 限制并发数，避免同时请求过多详情页
+                    async with self._detail_semaphore:
+                        return title, await self.get_pan_link(href, headers)
+                
+                # 按搜索页面中的顺序确认结果，前max_results个有效结果确定后取消其余请求
+                tasks = [asyncio.create_task(_fetch(t, h)) for t, h in candidates]
+                results = []
                 try:
-                    # 保存当前使用的域名
-                    parsed_url = urllib.parse.urlparse(base_url)
-                    self.last_used_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                    logger.info(f'保存当前域名: {self.last_used_domain}')
-                    
-                    # 添加随机延迟，避免请求过于频繁
-                    await asyncio.sleep(random.uniform(0.5, 1.5))
-                    
-                    url = f'{base_url}?q={keyword}'
-                    logger.info(f'正在访问: {url}')
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(url, headers=headers, timeout=30) as response:
-                            if response.status != 200:
-                                logger.error(f"搜索页面请求失败，状态码: {response.status}")
-                                continue
-                            html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    links = soup.find_all('a', href=True)
-                    results = []
-                    for link in links:
-                        href = link.get('href')
-                        title = link.get('title', '')
-                        title = re.sub(r'</?strong>', '', title)
-                        if href and (href.startswith('http') or href.startswith('https')) and 'id=' in href:
-                            pan_link = await self.get_pan_link(href, headers)
-                            if pan_link:
-                                results.append({'title': title, 'pan_link': pan_link})
-                    logger.info(f'搜索完成，找到 {len(results)} 个有效结果')
-                    if results:
-                        return results
-                except Exception as e:
-                    logger.error(f'使用 {base_url} 搜索短剧时发生错误: {e}')
-        
+                    for task in tasks:
+                        try:
+                            title, pan_link = await task
+                        except Exception as e:
+                            logger.error(f'获取网盘链接任务异常: {e}')
+                            continue
+                        if pan_link:
+                            results.append({'title': title, 'pan_link': pan_link})
+                            if len(results) >= self.max_results:
+                                break
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                logger.info(f'搜索完成，找到 {len(results)} 个有效结果')
+                if results:
+                    return results
+            except Exception as e:
+                logger.error(f'使用 {base_url} 搜索短剧时发生错误: {e}')
+                self._alive_base_url = None
+    
         logger.error('所有网站均无法访问或搜索失败')
         return []  # 确保返回空列表而不是None
 
+    async def _scan_search_links(self, response, limit):
+        """流式读取搜索页面，边下载边提取详情页链接，收集到limit个详情页后停止解析"""
+        encoding = response.charset or 'utf-8'
+        candidates = []
+        # 同一详情页常有多个<a>（缩略图、标题等），按id参数去重，格式为 {id: candidates中的下标}
+        seen = {}
+        buf = bytearray()
+        done = False
+        async for chunk in response.content.iter_chunked(8192):
+            if done:
+                # 剩余内容只读取不解析，读到结尾连接才能放回连接池复用
+                continue
+            buf.extend(chunk)
+            pos = 0
+            for tag_match in _ANCHOR_TAG_RE.finditer(buf):
+                pos = tag_match.end()
+                attrs = {}
+                for name, dq_value, sq_value in _ATTR_RE.findall(tag_match.group(0)):
+                    attrs[name.lower()] = unescape((dq_value or sq_value).decode(encoding, errors='replace'))
+                href = attrs.get(b'href')
+                title = _STRONG_RE.sub('', attrs.get(b'title', ''))
+                if href and (href.startswith('http') or href.startswith('https')) and 'id=' in href:
+                    key = urllib.parse.parse_qs(urllib.parse.urlparse(href).query).get('id', [href])[0]
+                    if key in seen:
+                        # 保留第一个非空标题
+                        index = seen[key]
+                        if not candidates[index][0] and title:
+                            candidates[index] = (title, candidates[index][1])
+                        continue
+                    # 出现第limit+1个详情页时结束，确保前limit个详情页的所有<a>都已处理
+                    if len(candidates) >= limit:
+                        done = True
+                        break
+                    seen[key] = len(candidates)
+                    candidates.append((title, href))
+            # 丢弃已处理的内容，只保留可能未接收完整的<a>标签
+            tail = max(buf.rfind(b'<a', pos), buf.rfind(b'<A', pos))
+            if tail == -1:
+                tail = max(pos, len(buf) - 1)
+            del buf[:tail]
+        return candidates
+
+    def _match_pan_link(self, body, charset):
+        """在详情页原始字节中匹配网盘链接，无需解码和解析DOM"""
+        pattern = _PAN_RE_BYTES
+        encoding = (charset or 'utf-8').lower()
+        if encoding not in ('utf-8', 'utf8'):
+            try:
+                pattern = re.compile(_PAN_RE.pattern.encode(encoding))
+            except (LookupError, UnicodeEncodeError):
+                pass
+        match = pattern.search(body)
+        return match.group(1).decode('ascii') if match else None
+
     async def get_pan_link(self, url, headers):
+        # 同一详情页的网盘链接很少变化，命中缓存时直接返回
+        entry = self._pan_cache.get(url)
+        if entry:
+            timestamp, pan_link = entry
+            expire_time = self.pan_cache_expire_time if pan_link else self.pan_cache_negative_expire_time
+            if time.monotonic() - timestamp < expire_time:
+                self._pan_cache.move_to_end(url)
+                return pan_link
+            del self._pan_cache[url]
+        
         try:
-            # 添加随机延迟，避免请求过于频繁
-            await asyncio.sleep(random.uniform(0.5, 1.5))
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, timeout=30) as response:
-                    if response.status != 200:
+            session = await self._get_session()
+            limiter = self._get_rate_limiter(url)
+            max_retries = 3
+            for retry_count in range(max_retries):
+                await limiter.acquire()
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 200:
+                        # 完整读取响应体，连接才能放回连接池复用
+                        body = await response.read()
+                        pan_link = self._match_pan_link(body, response.charset)
+                        break
+                    if response.status != 429 and response.status < 500:
+                        self._put_cache(self._pan_cache, url, (time.monotonic(), None), self.pan_cache_size)
+                        return None
+                    if retry_count == max_retries - 1:
+                        logger.warning(f'获取详情页失败，状态码: {response.status}，已达到最大重试次数: {url}')
+                        return None
+                    # 被限流或服务端错误时退避重试，优先遵循Retry-After
+                    # 等待期间占用详情页并发名额，超过上限的Retry-After直接放弃，避免拖住其他搜索
+                    retry_after = response.headers.get('Retry-After', '')
+                    delay = float(retry_after) if retry_after.isdigit() else 0.5 * 2 ** retry_count
+                    if delay > self.max_retry_delay:
+                        logger.warning(f'获取详情页失败，状态码: {response.status}，Retry-After {delay}秒超过上限，放弃: {url}')
                         return None
-                    html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
-            meta_desc = soup.find('meta', {'name': 'description'})
-            if meta_desc and meta_desc.get('content'):
-                content = meta_desc['content']
-                pan_link_match = re.search(r'链接：(https://pan\.quark\.cn/s/[a-zA-Z0-9]+)', content)
-                if pan_link_match:
-                    return pan_link_match.group(1)
+                    logger.warning(f'获取详情页失败，状态码: {response.status}，{delay}秒后重试: {url}')
+                await asyncio.sleep(delay)
+            self._put_cache(self._pan_cache, url, (time.monotonic(), pan_link), self.pan_cache_size)
+            return pan_link
         except Exception as e:
             logger.error(f'获取网盘链接时发生错误: {e}')
         return None